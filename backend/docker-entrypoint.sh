@@ -5,7 +5,14 @@ exec "$@"
 uv run manage.py migrate
 uv run manage.py runserver 0.0.0.0:8000 &
 
-uv run celery -A settings worker --loglevel=info &
+# Periodic jobs (message archival) are scheduled by the separate celery-beat service
+if [ -n "$AGENT_SHARD" ]; then
+    # Shard workers keep per-conversation context in memory, so they run as a
+    # single process with a thread pool instead of prefork children
+    uv run celery -A settings worker -Q "$AGENT_SHARD",celery -P threads --loglevel=info &
+else
+    uv run celery -A settings worker --loglevel=info &
+fi
 
 wait -n
 
@@ -10,7 +10,13 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 
 SECRET_KEY = os.getenv('SECRET_KEY')
 
-DEBUG = True # False in production
+# Read once per process; the agent only checks it when it first talks to OpenAI
+OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
+
+# Base URL the agent uses to reach this API (history tool)
+API_BASE_URL = os.getenv('VITE_API_URL')
+
+DEBUG = os.getenv('DEBUG', 'False').lower() == 'true'
 
 ALLOWED_HOSTS = ["*"] # Only the frontend application need to have access in production
 
@@ -33,6 +39,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'tools.middleware.CompressionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -134,16 +141,94 @@ SIMPLE_JWT = {
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [],
     'DEFAULT_RENDERER_CLASSES': (
-        'rest_framework.renderers.JSONRenderer',
+        'tools.renderers.ORJSONRenderer',
     ) if not DEBUG else (
-        'rest_framework.renderers.JSONRenderer',
+        'tools.renderers.ORJSONRenderer',
         'rest_framework.renderers.BrowsableAPIRenderer',
     ),
+    'DEFAULT_PARSER_CLASSES': (
+        'tools.renderers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
     'DEFAULT_AUTHENTICATION_CLASSES': [],
 }
 
+# Response compression (tools/middleware.py)
+RESPONSE_COMPRESSION_MIN_BYTES = 1024
+RESPONSE_COMPRESSION_TYPES = ('application/json',)
+RESPONSE_COMPRESSION_PATHS = ('/api/tools/',)
+RESPONSE_BROTLI_QUALITY = 5
+
 CELERY_BROKER_URL = 'redis://redis:6379/1'
 
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('CACHE_URL', 'redis://redis:6379/2'),
+    }
+}
+
+CELERY_BEAT_SCHEDULE = {
+    'archive-conversation-messages': {
+        'task': 'tools.tasks.archive_conversation_messages',
+        'schedule': timedelta(hours=1),
+    },
+}
+
+# Finished/killed messages older than this are moved to ArchivedConversationMessage
+CONVERSATION_ARCHIVE_RETENTION_DAYS = int(os.getenv('CONVERSATION_ARCHIVE_RETENTION_DAYS', 30))
+CONVERSATION_ARCHIVE_BATCH_SIZE = 500
+
+# Bulk transcript ingestion (tools/store/bulk/ and the import_transcripts command)
+BULK_INGEST_MAX_BATCH = 1000
+
+# Speculative context preparation from interim transcripts (tools/speculative.py)
+SPECULATIVE_CONTEXT_TTL = 120
+SPECULATIVE_HISTORY_LIMIT = 5
+# Characters a partial must grow by before context is prepared again
+SPECULATIVE_MIN_GROWTH = 20
+# Share of the final transcript the partial must cover for its scene to be reused
+SPECULATIVE_MIN_COVERAGE = 0.6
+
+# Server-side text-to-speech (tools/tts.py). Off by default: the frontend still
+# speaks responses itself and does not play the /api/tools/tts/ audio yet.
+# Workers write audio to TTS_CACHE_DIR and the API serves it from there, so when
+# enabled the directory must be shared by both (same host or a shared volume).
+TTS_ENABLED = os.getenv('TTS_ENABLED', 'false').lower() == 'true'
+TTS_PROVIDER = os.getenv('TTS_PROVIDER', 'tools.tts.LocalTTSProvider')
+TTS_VOICE = os.getenv('TTS_VOICE', 'EXAVITQu4vr4xnSDxMaL')
+ELEVENLABS_API_KEY = os.getenv('ELEVENLABS_API_KEY')
+TTS_CACHE_DIR = os.getenv('TTS_CACHE_DIR', os.path.join(BASE_DIR, 'tts_cache'))
+TTS_CACHE_MAX_BYTES = int(os.getenv('TTS_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+
+# Conversation-affinity routing (tools/affinity.py). With AGENT_SHARD_COUNT=N, start
+# each worker with AGENT_SHARD=agent-<i> and `celery -A settings worker -Q agent-<i>,celery -P threads`.
+# The warm context is per process, so a shard needs a single process (threads pool
+# or --concurrency=1). A shard's queued messages wait for a worker with the same
+# AGENT_SHARD to come back; they are not re-routed when its heartbeat expires.
+AGENT_SHARDS = [f'agent-{i}' for i in range(int(os.getenv('AGENT_SHARD_COUNT', 0)))]
+AGENT_SHARD = os.getenv('AGENT_SHARD')
+AFFINITY_HEARTBEAT_INTERVAL = 10
+AFFINITY_HEARTBEAT_TTL = 30
+AFFINITY_RING_REFRESH = 5
+AFFINITY_CONTEXT_CACHE_SIZE = 256
+# Finished turns kept per conversation in a worker's warm context
+AFFINITY_HISTORY_WINDOW = 20
+
+# Agent events buffered before a bulk insert (tools/events.py)
+AGENT_EVENT_BATCH_SIZE = 20
+
+# LLM record/replay (tools/cassette.py): 'off', 'record' or 'replay'
+LLM_CASSETTE_MODE = os.getenv('LLM_CASSETTE_MODE', 'off')
+LLM_CASSETTE_PATH = os.getenv('LLM_CASSETTE_PATH', os.path.join(BASE_DIR, 'cassettes', 'llm.jsonl.gz'))
+# Multiplier applied to recorded latencies on replay; 0 disables sleeping
+LLM_CASSETTE_LATENCY_SCALE = float(os.getenv('LLM_CASSETTE_LATENCY_SCALE', 1.0))
+# 'request' matches on a hash of the request (timestamps normalized), 'sequence'
+# replays in recorded order. Each worker process replays the file from the start,
+# so sequence mode needs a single process: celery -A settings worker --concurrency=1
+LLM_CASSETTE_MATCH = os.getenv('LLM_CASSETTE_MATCH', 'request')
+
 
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = 'smtp.gmail.com'
@@ -0,0 +1,192 @@
+"""Conversation-affinity routing of agent work.
+
+Conversation ids are mapped onto the configured shard queues
+(``AGENT_SHARDS``) with a consistent hash ring, so consecutive turns of a
+call land on the same worker and find its per-conversation context warm.
+Workers announce their shard with a heartbeat in the cache; the ring is
+built from the shards that are currently alive, so when a worker joins or
+leaves only the conversations hashed to that shard move. Messages without
+a conversation id, or sent while no shard is alive, go to the default
+queue.
+
+The warm context lives in the worker process, so a shard must be served by
+a single process: run its worker with ``-P threads`` (or
+``--concurrency=1``), not prefork children that each keep their own cache.
+Routing only affects new messages. Messages already waiting on the queue of
+a shard whose heartbeat expired stay there until a worker for that shard
+name starts again and consumes them.
+"""
+import bisect
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import ConversationMessage
+
+logger = logging.getLogger(__name__)
+
+SHARD_KEY = 'affinity:shard:{}'
+
+
+class HashRing:
+    """Consistent hash ring with ``replicas`` virtual nodes per shard."""
+
+    def __init__(self, nodes, replicas=64):
+        self.nodes = tuple(nodes)
+        self._ring = sorted(
+            (self._hash(f"{node}#{replica}"), node)
+            for node in self.nodes for replica in range(replicas)
+        )
+        self._hashes = [point for point, _ in self._ring]
+
+    @staticmethod
+    def _hash(value):
+        return int.from_bytes(hashlib.md5(value.encode('utf-8')).digest()[:8], 'big')
+
+    def node_for(self, key):
+        if not self._ring:
+            return None
+        index = bisect.bisect(self._hashes, self._hash(key)) % len(self._ring)
+        return self._ring[index][1]
+
+
+_ring = HashRing(())
+_ring_expires = 0.0
+_ring_lock = threading.Lock()
+
+
+def live_shards():
+    keys = [SHARD_KEY.format(shard) for shard in settings.AGENT_SHARDS]
+    alive = cache.get_many(keys)
+    return tuple(shard for shard, key in zip(settings.AGENT_SHARDS, keys) if key in alive)
+
+
+def current_ring():
+    """Ring over the live shards, rebuilt at most every AFFINITY_RING_REFRESH seconds."""
+    global _ring, _ring_expires
+    with _ring_lock:
+        if time.monotonic() >= _ring_expires:
+            shards = live_shards()
+            if shards != _ring.nodes:
+                logger.info(f"Rebalancing conversation affinity ring onto shards {list(shards)}")
+                _ring = HashRing(shards)
+            _ring_expires = time.monotonic() + settings.AFFINITY_RING_REFRESH
+        return _ring
+
+
+def queue_for(conversation_id):
+    """Queue for a conversation's work, or None for Celery's default queue."""
+    if not conversation_id or not settings.AGENT_SHARDS:
+        return None
+    return current_ring().node_for(conversation_id)
+
+
+def _heartbeat(shard, stop):
+    while not stop.wait(settings.AFFINITY_HEARTBEAT_INTERVAL):
+        cache.set(SHARD_KEY.format(shard), True, settings.AFFINITY_HEARTBEAT_TTL)
+
+
+_stop_heartbeat = threading.Event()
+
+
+def register_shard(shard):
+    """Announce this worker's shard and keep the announcement alive."""
+    cache.set(SHARD_KEY.format(shard), True, settings.AFFINITY_HEARTBEAT_TTL)
+    _stop_heartbeat.clear()
+    threading.Thread(target=_heartbeat, args=(shard, _stop_heartbeat), daemon=True).start()
+    logger.info(f"Worker serving conversation shard {shard}")
+
+
+def unregister_shard(shard):
+    _stop_heartbeat.set()
+    cache.delete(SHARD_KEY.format(shard))
+
+
+class ContextLRU:
+    """Bounded, thread-safe in-process cache of per-conversation context."""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+_contexts = None
+
+
+def get_contexts():
+    global _contexts
+    if _contexts is None:
+        _contexts = ContextLRU(settings.AFFINITY_CONTEXT_CACHE_SIZE)
+    return _contexts
+
+
+def _previous_message_id(msg):
+    return (
+        ConversationMessage.objects
+        .filter(conversation_id=msg.conversation_id, timestamp__lte=msg.timestamp)
+        .exclude(id=msg.id)
+        .order_by('-timestamp')
+        .values_list('id', flat=True)
+        .first()
+    )
+
+
+def cached_history(msg, limit):
+    """History window for ``msg`` from the warm context, as the history API would return it.
+
+    Returns None when this worker has no context for the conversation, when
+    it is stale (another message was added since the last turn seen here), or
+    when it holds fewer turns than ``limit`` asks for.
+    """
+    if not msg.conversation_id:
+        return None
+    entry = get_contexts().get(msg.conversation_id)
+    if entry is None or entry["last_message_id"] != _previous_message_id(msg):
+        return None
+    needed = max(limit - 1, 0)
+    if not entry["complete"] and len(entry["turns"]) < needed:
+        return None
+    turns = entry["turns"][-needed:] if needed else []
+    history = [item for turn in turns for item in turn] + msg.history_entries()
+    return json.dumps(history, cls=JSONEncoder)
+
+
+def remember_turn(msg):
+    """Add a finished turn to the conversation's warm context."""
+    if not msg.conversation_id:
+        return
+    contexts = get_contexts()
+    entry = contexts.get(msg.conversation_id)
+    previous_id = _previous_message_id(msg)
+    if entry is None or entry["last_message_id"] != previous_id:
+        # Earlier turns were handled elsewhere; start over from this one. The
+        # context is complete only if this is the conversation's first message.
+        turns, complete = [], previous_id is None
+    else:
+        turns, complete = entry["turns"], entry["complete"]
+    turns = turns + [msg.history_entries()]
+    if len(turns) > settings.AFFINITY_HISTORY_WINDOW:
+        turns, complete = turns[-settings.AFFINITY_HISTORY_WINDOW:], False
+    contexts.put(msg.conversation_id, {"last_message_id": msg.id, "turns": turns, "complete": complete})
@@ -1,11 +1,39 @@
 import openai
 import json
 
+from django.conf import settings
+
+from .cassette import get_cassette
+from .events import record_usage
+
+_client = None
+
+def get_client():
+    """Return the process-wide OpenAI client, creating it on first use."""
+    global _client
+    if _client is None:
+        if not settings.OPENAI_API_KEY:
+            raise ValueError("OpenAI API key not found. Check your .env file.")
+        _client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
+    return _client
+
+def create_chat_completion(**request):
+    """Send a chat completion request, going through the LLM cassette when one is active."""
+    def send():
+        return get_client().chat.completions.create(**request)
+
+    cassette = get_cassette()
+    if cassette is None:
+        response = send()
+    else:
+        response = cassette.chat_completion(request, send)
+    record_usage(response)
+    return response
+
 def call_agent(messages, tools, logger):
     """Call OpenAI API with the current message history and available tools."""
     try:
-        client = openai.OpenAI(api_key=openai.api_key)
-        response = client.chat.completions.create(
+        response = create_chat_completion(
             model="gpt-4o",
             messages=messages,
             tools=tools,
@@ -35,8 +63,7 @@ def call_agent(messages, tools, logger):
 def call_agent_no_tools(messages, logger):
     """Call OpenAI API without tools for a direct, conversational response."""
     try:
-        client = openai.OpenAI(api_key=openai.api_key)
-        response = client.chat.completions.create(
+        response = create_chat_completion(
             model="gpt-4o-mini",
             messages=messages
         )
@@ -0,0 +1,44 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ConversationMessage, ArchivedConversationMessage
+
+logger = logging.getLogger(__name__)
+
+
+def archive_old_messages(retention_days=None, batch_size=None):
+    """Move finished/killed messages older than the retention window into the archive table.
+
+    Works in batches, each in its own transaction, so the hot table is never
+    locked for long. Returns the number of messages archived.
+    """
+    if retention_days is None:
+        retention_days = settings.CONVERSATION_ARCHIVE_RETENTION_DAYS
+    if batch_size is None:
+        batch_size = settings.CONVERSATION_ARCHIVE_BATCH_SIZE
+
+    cutoff = timezone.now() - timedelta(days=retention_days)
+    archived = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                ConversationMessage.objects
+                .select_for_update(skip_locked=True)
+                .filter(status__in=ConversationMessage.ARCHIVABLE_STATUSES, timestamp__lt=cutoff)
+                .order_by('timestamp')[:batch_size]
+            )
+            if not batch:
+                break
+            ArchivedConversationMessage.objects.bulk_create(
+                [ArchivedConversationMessage.from_message(msg) for msg in batch],
+                ignore_conflicts=True,
+            )
+            ConversationMessage.objects.filter(id__in=[msg.id for msg in batch]).delete()
+        archived += len(batch)
+
+    logger.info(f"Archived {archived} messages older than {cutoff.isoformat()}")
+    return archived
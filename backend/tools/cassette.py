@@ -0,0 +1,132 @@
+import fcntl
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import defaultdict, deque
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+MODES = ('off', 'record', 'replay')
+
+
+class CassetteMissError(LookupError):
+    """Raised in replay mode when no recorded response matches a request."""
+
+
+# Conversation history is embedded in the prompts with each message's
+# timestamp; those differ between databases, so they are left out of the key.
+TIMESTAMP_RE = re.compile(
+    r'\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:\.\d+)?(?:Z|[+-]\d{2}:?\d{2})?'
+)
+
+
+def request_key(request):
+    payload = json.dumps(request, sort_keys=True, default=str)
+    payload = TIMESTAMP_RE.sub('<timestamp>', payload)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
+
+
+class Cassette:
+    """On-disk store of chat completion request/response pairs.
+
+    Entries are gzip-compressed JSON lines holding the request key, the model,
+    the raw response and the latency observed while recording. In replay mode
+    responses are served by request key (or in recorded order when ``match``
+    is ``'sequence'``) and the original latency is slept for, multiplied by
+    ``latency_scale``.
+    """
+
+    def __init__(self, path, mode, latency_scale=1.0, match='request'):
+        if mode not in MODES:
+            raise ValueError(f"Invalid cassette mode {mode!r}. Allowed values are: {MODES}")
+        self.path = path
+        self.mode = mode
+        self.latency_scale = latency_scale
+        self.match = match
+        self._lock = threading.Lock()
+        self._by_key = defaultdict(deque)
+        self._sequence = deque()
+        if mode == 'replay':
+            self._load()
+        elif mode == 'record':
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+    def _load(self):
+        with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                self._by_key[entry['key']].append(entry)
+                self._sequence.append(entry)
+        logger.info(f"Loaded {len(self._sequence)} LLM cassette entries from {self.path}")
+
+    def _append(self, entry):
+        line = json.dumps(entry, separators=(',', ':')) + '\n'
+        with self._lock, open(self.path, 'ab') as raw:
+            fcntl.flock(raw, fcntl.LOCK_EX)
+            try:
+                with gzip.GzipFile(fileobj=raw, mode='ab') as f:
+                    f.write(line.encode('utf-8'))
+            finally:
+                fcntl.flock(raw, fcntl.LOCK_UN)
+
+    def _next_entry(self, request, key):
+        with self._lock:
+            if self.match == 'sequence':
+                if not self._sequence:
+                    raise CassetteMissError("LLM cassette exhausted")
+                return self._sequence.popleft()
+            recorded = self._by_key.get(key)
+            if not recorded:
+                raise CassetteMissError(
+                    f"No recorded response for {request.get('model')} request {key}"
+                )
+            return recorded.popleft()
+
+    def chat_completion(self, request, send):
+        """Serve ``request`` from the cassette, or call ``send()`` and record it."""
+        key = request_key(request)
+        if self.mode == 'replay':
+            entry = self._next_entry(request, key)
+            if self.latency_scale:
+                time.sleep(entry['latency'] * self.latency_scale)
+            from openai.types.chat import ChatCompletion
+            return ChatCompletion.model_validate(entry['response'])
+
+        start = time.monotonic()
+        response = send()
+        latency = time.monotonic() - start
+        if self.mode == 'record':
+            self._append({
+                'key': key,
+                'model': request.get('model'),
+                'latency': round(latency, 4),
+                'response': response.model_dump(mode='json', exclude_unset=True),
+            })
+        return response
+
+
+_cassette = None
+
+
+def get_cassette():
+    """Return the process-wide cassette, or None when LLM_CASSETTE_MODE is 'off'."""
+    global _cassette
+    if settings.LLM_CASSETTE_MODE == 'off':
+        return None
+    if _cassette is None:
+        _cassette = Cassette(
+            settings.LLM_CASSETTE_PATH,
+            settings.LLM_CASSETTE_MODE,
+            latency_scale=settings.LLM_CASSETTE_LATENCY_SCALE,
+            match=settings.LLM_CASSETTE_MATCH,
+        )
+    return _cassette
@@ -0,0 +1,36 @@
+"""Enqueue agent work by task name.
+
+The API process only needs Celery to publish messages, so it goes through
+these helpers instead of importing ``tools.tasks`` (and with it the OpenAI
+client and the rest of the agent stack). Per-message work is routed to the
+conversation's shard queue (see ``tools.affinity``).
+"""
+from celery import current_app, group
+
+from .affinity import queue_for
+
+PROCESS_MESSAGE_TASK = 'tools.tasks.process_message_and_update'
+PREPARE_CONTEXT_TASK = 'tools.tasks.prepare_speculative_context'
+
+
+def enqueue_message(message_id, conversation_id=''):
+    return current_app.send_task(PROCESS_MESSAGE_TASK, args=(message_id,),
+                                 queue=queue_for(conversation_id))
+
+
+def enqueue_messages(messages):
+    """Enqueue ``(message_id, conversation_id)`` pairs, one task per message.
+
+    Each message gets its own signature (not a chunk) so a failing turn is
+    retried on its own and cannot abort the rest of the batch.
+    """
+    return group(
+        current_app.signature(PROCESS_MESSAGE_TASK, args=(message_id,),
+                              queue=queue_for(conversation_id))
+        for message_id, conversation_id in messages
+    ).apply_async()
+
+
+def enqueue_speculative_context(transcript, conversation_id=''):
+    return current_app.send_task(PREPARE_CONTEXT_TASK, args=(transcript, conversation_id),
+                                 queue=queue_for(conversation_id))
@@ -0,0 +1,111 @@
+"""Append-only agent event log.
+
+``AgentEventRecorder`` tracks the steps of one turn against a monotonic
+clock and buffers them in memory; events are written with a single
+``bulk_create`` when the buffer fills up or the turn ends. Token usage
+reported by chat completions made while a step is open is attributed to it.
+"""
+import logging
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db.models import Avg, Count, Max, OuterRef, Subquery, Sum
+
+from .models import AgentEvent
+
+logger = logging.getLogger(__name__)
+
+_current_recorder = ContextVar('agent_event_recorder', default=None)
+
+
+def record_usage(response):
+    """Add a chat completion's token usage to the step currently being recorded."""
+    recorder = _current_recorder.get()
+    usage = getattr(response, 'usage', None)
+    if recorder is not None and usage is not None:
+        recorder.add_tokens(usage.prompt_tokens or 0, usage.completion_tokens or 0)
+
+
+class AgentEventRecorder:
+
+    def __init__(self, message_id, attempt=0):
+        self.message_id = message_id
+        self.attempt = attempt
+        self._origin = time.monotonic()
+        self._sequence = 0
+        self._open = None
+        self._buffer = []
+        self._token = _current_recorder.set(self)
+
+    def start(self, step, scene):
+        """Close the open step, if any, and open ``step``."""
+        self._close()
+        self._open = AgentEvent(
+            message_id=self.message_id,
+            attempt=self.attempt,
+            sequence=self._sequence,
+            step=step,
+            scene=scene,
+            started_at=time.monotonic() - self._origin,
+        )
+        self._sequence += 1
+
+    def add_tokens(self, prompt_tokens, completion_tokens):
+        if self._open is not None:
+            self._open.prompt_tokens += prompt_tokens
+            self._open.completion_tokens += completion_tokens
+
+    def _close(self):
+        if self._open is None:
+            return
+        self._open.duration = time.monotonic() - self._origin - self._open.started_at
+        self._buffer.append(self._open)
+        self._open = None
+        if len(self._buffer) >= settings.AGENT_EVENT_BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        if self._buffer:
+            AgentEvent.objects.bulk_create(self._buffer)
+            self._buffer = []
+
+    def finish(self):
+        """Close the last step, write everything buffered and stop collecting token usage."""
+        try:
+            self._close()
+            self.flush()
+        except Exception as e:
+            logger.error(f"Failed to write agent events for message {self.message_id}: {str(e)}")
+        finally:
+            _current_recorder.reset(self._token)
+
+
+def step_latency_breakdown(turns=100):
+    """Per-step latency and token totals over the most recent ``turns`` turns.
+
+    Only the last attempt of each turn is counted, so steps of runs that
+    failed and were retried do not inflate the totals.
+    """
+    message_ids = (
+        AgentEvent.objects.order_by('-message_id')
+        .values_list('message_id', flat=True).distinct()[:turns]
+    )
+    last_attempt = (
+        AgentEvent.objects.filter(message_id=OuterRef('message_id'))
+        .order_by('-attempt').values('attempt')[:1]
+    )
+    rows = (
+        AgentEvent.objects.filter(message_id__in=list(message_ids), attempt=Subquery(last_attempt))
+        .values('step')
+        .annotate(
+            count=Count('id'),
+            avg_duration=Avg('duration'),
+            max_duration=Max('duration'),
+            total_duration=Sum('duration'),
+            prompt_tokens=Sum('prompt_tokens'),
+            completion_tokens=Sum('completion_tokens'),
+        )
+        .order_by('-total_duration')
+    )
+    return list(rows)
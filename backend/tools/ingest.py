@@ -0,0 +1,122 @@
+import logging
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import ConversationMessage
+from .dispatch import enqueue_messages
+
+logger = logging.getLogger(__name__)
+
+
+def validate_transcripts(items, process=True):
+    """Validate a batch of transcript payloads.
+
+    When the batch is not going to be processed, items default to
+    ``finished``, may not be ``in_progress`` and must carry the ISO 8601
+    ``timestamp`` of the original message, so imported history never looks
+    like (or is newer than) a live turn.
+
+    Processed batches replay independent turns: each turn is answered
+    against the history already stored, so at most one ``in_progress`` item
+    per conversation is accepted. Import earlier turns with ``process``
+    off first.
+
+    Returns ``(messages, errors)`` where ``messages`` are unsaved
+    ConversationMessage instances and ``errors`` lists ``{"index", "error"}``
+    entries for the items that were rejected.
+    """
+    allowed_statuses = [choice[0] for choice in ConversationMessage.STATUS_CHOICES]
+    if not process:
+        allowed_statuses.remove('in_progress')
+    default_status = 'in_progress' if process else 'finished'
+    queued_conversations = set()
+    messages = []
+    errors = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            errors.append({"index": index, "error": "Each item must be an object."})
+            continue
+        transcript = item.get("transcript")
+        if not transcript or not isinstance(transcript, str):
+            errors.append({"index": index, "error": "No transcript provided."})
+            continue
+        status_value = item.get("status", default_status)
+        if status_value not in allowed_statuses:
+            errors.append({"index": index,
+                           "error": f"Invalid status. Allowed values are: {allowed_statuses}"})
+            continue
+        ai_response = item.get("ai_response")
+        if ai_response is not None and not isinstance(ai_response, str):
+            errors.append({"index": index, "error": "ai_response must be a string."})
+            continue
+        conversation_id = item.get("conversation_id", "")
+        if not isinstance(conversation_id, str) or len(conversation_id) > 64:
+            errors.append({"index": index, "error": "Invalid conversation_id."})
+            continue
+        if status_value == 'in_progress' and conversation_id:
+            if conversation_id in queued_conversations:
+                errors.append({"index": index,
+                               "error": "Only one in_progress message per conversation can be processed "
+                                        "per batch. Import earlier turns with process disabled."})
+                continue
+            queued_conversations.add(conversation_id)
+        timestamp = item.get("timestamp")
+        if timestamp is None and not process:
+            errors.append({"index": index, "error": "timestamp is required when not processing."})
+            continue
+        if timestamp is not None:
+            try:
+                timestamp = parse_datetime(timestamp) if isinstance(timestamp, str) else None
+            except ValueError:
+                timestamp = None
+            if timestamp is None:
+                errors.append({"index": index, "error": "Invalid timestamp. Expected ISO 8601."})
+                continue
+            if timezone.is_naive(timestamp):
+                timestamp = timezone.make_aware(timestamp)
+            if timestamp > timezone.now():
+                errors.append({"index": index, "error": "timestamp is in the future."})
+                continue
+        message = ConversationMessage(
+            message=transcript,
+            conversation_id=conversation_id,
+            status=status_value,
+            ai_response=ai_response,
+        )
+        # Not a model field value yet: auto_now_add overwrites it on insert
+        message.original_timestamp = timestamp
+        messages.append(message)
+    return messages, errors
+
+
+def ingest_transcripts(messages, process=True):
+    """Insert validated messages with one bulk INSERT and optionally enqueue them.
+
+    Original timestamps are restored with one bulk UPDATE in the same
+    transaction. Only ``in_progress`` messages are queued for LLM
+    processing, one task per message so each turn retries and fails on its
+    own, and only once the rows are committed.
+    Returns ``(created, queued_ids)``.
+    """
+    with transaction.atomic():
+        created = ConversationMessage.objects.bulk_create(messages)
+
+        backdated = []
+        for msg in created:
+            original = getattr(msg, 'original_timestamp', None)
+            if original is not None:
+                msg.timestamp = original
+                backdated.append(msg)
+        if backdated:
+            ConversationMessage.objects.bulk_update(backdated, ['timestamp'])
+
+        queued_ids = []
+        if process:
+            queued = [(msg.id, msg.conversation_id) for msg in created if msg.status == 'in_progress']
+            queued_ids = [message_id for message_id, _ in queued]
+            if queued:
+                transaction.on_commit(lambda: enqueue_messages(queued))
+    logger.info(f"Ingested {len(created)} messages, queued {len(queued_ids)} for processing")
+    return created, queued_ids
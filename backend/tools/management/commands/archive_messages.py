@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from tools.archive import archive_old_messages
+
+
+class Command(BaseCommand):
+    help = "Move finished/killed messages older than the retention window into the archive table."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--retention-days", type=int, default=None,
+                            help="Override CONVERSATION_ARCHIVE_RETENTION_DAYS.")
+        parser.add_argument("--batch-size", type=int, default=None,
+                            help="Override CONVERSATION_ARCHIVE_BATCH_SIZE.")
+
+    def handle(self, *args, **options):
+        archived = archive_old_messages(
+            retention_days=options["retention_days"],
+            batch_size=options["batch_size"],
+        )
+        self.stdout.write(self.style.SUCCESS(f"Archived {archived} messages."))
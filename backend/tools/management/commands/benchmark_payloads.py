@@ -0,0 +1,70 @@
+import random
+import timeit
+
+import brotli
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from django.utils.text import compress_string
+from rest_framework.renderers import JSONRenderer
+
+from tools.middleware import CompressionMiddleware
+from tools.renderers import ORJSONRenderer
+
+
+class Command(BaseCommand):
+    help = ("Compare rendering time and wire size of history and status payloads "
+            "for DRF's JSONRenderer and the orjson renderer, raw and compressed.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--messages", type=int, default=50,
+                            help="Number of messages in the history payload.")
+        parser.add_argument("--transcript-chars", type=int, default=1500,
+                            help="Length of each transcript and response.")
+        parser.add_argument("--iterations", type=int, default=500)
+
+    def handle(self, *args, **options):
+        words = ("i keep putting off the conversation with my manager about promotion because "
+                 "feel stuck every time we talk it goes same way and want to change that").split()
+        rng = random.Random(0)
+
+        def make_text():
+            return " ".join(rng.choice(words) for _ in range(options["transcript_chars"] // 5))
+        now = timezone.now()
+
+        # Same shapes as ConversationHistoryView and MessageStatusView produce
+        history = []
+        for _ in range(options["messages"]):
+            history.append({"role": "user", "content": make_text(), "status": "finished", "timestamp": now})
+            history.append({"role": "assistant", "content": make_text(), "timestamp": now})
+        status_payload = {
+            "transcript": make_text(),
+            "status": "finished",
+            "scene": "R2",
+            "agent_state": "final-answer",
+            "ai_response": make_text(),
+            "timestamp": now,
+        }
+
+        renderers = [("drf-json", JSONRenderer()), ("orjson", ORJSONRenderer())]
+        iterations = options["iterations"]
+        for name, payload in (("history", history), ("status", status_payload)):
+            self.stdout.write(f"{name} payload:")
+            for renderer_name, renderer in renderers:
+                seconds = timeit.timeit(lambda: renderer.render(payload), number=iterations)
+                self.stdout.write(
+                    f"  {renderer_name:<9} render {seconds / iterations * 1e6:9.1f}us"
+                )
+            body = ORJSONRenderer().render(payload)
+            padding = CompressionMiddleware.max_random_bytes
+            gzipped = compress_string(body, max_random_bytes=padding)
+            brotlied = brotli.compress(body, quality=settings.RESPONSE_BROTLI_QUALITY)
+            gzip_us = timeit.timeit(
+                lambda: compress_string(body, max_random_bytes=padding), number=iterations
+            ) / iterations * 1e6
+            brotli_us = timeit.timeit(
+                lambda: brotli.compress(body, quality=settings.RESPONSE_BROTLI_QUALITY), number=iterations
+            ) / iterations * 1e6
+            self.stdout.write(f"  raw       {len(body):9d} bytes")
+            self.stdout.write(f"  gzip      {len(gzipped):9d} bytes  {gzip_us:9.1f}us")
+            self.stdout.write(f"  brotli    {len(brotlied):9d} bytes  {brotli_us:9.1f}us")
@@ -0,0 +1,54 @@
+import re
+import subprocess
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+# Modules the API process must be able to serve and enqueue without loading
+API_MODULES = ("settings.urls", "tools.views", "tools.ingest", "tools.dispatch")
+HEAVY_MODULES = ("openai", "tools.tasks", "tools.agent", "tools.cassette")
+
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)$")
+
+
+class Command(BaseCommand):
+    help = ("Import the API modules in a fresh interpreter and fail if they pull in the "
+            "agent/LLM stack or exceed the import time budget.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--budget-ms", type=float, default=1500,
+                            help="Maximum cumulative import time of the API modules.")
+
+    def handle(self, *args, **options):
+        code = "import django; django.setup(); " + "; ".join(f"import {m}" for m in API_MODULES)
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code],
+            capture_output=True, text=True,
+        )
+        if result.returncode != 0:
+            raise CommandError(f"Importing API modules failed:\n{result.stderr}")
+
+        imported = set()
+        total_us = 0
+        for line in result.stderr.splitlines():
+            match = IMPORTTIME_LINE.match(line)
+            if not match:
+                continue
+            cumulative, indent, module = int(match.group(2)), match.group(3), match.group(4)
+            imported.add(module)
+            # Only top-level imports (single space indent) add up to the total
+            if indent == " ":
+                total_us += cumulative
+
+        leaked = [m for m in HEAVY_MODULES if m in imported]
+        if leaked:
+            raise CommandError(f"API process imports heavy modules: {', '.join(leaked)}")
+
+        total_ms = total_us / 1000
+        if total_ms > options["budget_ms"]:
+            raise CommandError(
+                f"API import time {total_ms:.0f}ms exceeds budget of {options['budget_ms']:.0f}ms"
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"API modules imported in {total_ms:.0f}ms without the agent stack."
+        ))
@@ -0,0 +1,59 @@
+import json
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from tools.ingest import validate_transcripts, ingest_transcripts
+
+
+class Command(BaseCommand):
+    help = ("Bulk-import transcripts from a JSON array or JSON-lines file. "
+            "Imported messages only populate history (as finished, at their required "
+            "'timestamp') unless --process is given, which replays at most one "
+            "in_progress turn per conversation.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Path to a .json/.jsonl file, or '-' for stdin.")
+        parser.add_argument("--process", action="store_true",
+                            help="Queue in_progress messages for LLM processing.")
+        parser.add_argument("--batch-size", type=int, default=settings.BULK_INGEST_MAX_BATCH,
+                            help="Number of messages per INSERT.")
+
+    def handle(self, *args, **options):
+        items = self._read_items(options["path"])
+        messages, errors = validate_transcripts(items, process=options["process"])
+        if errors:
+            for error in errors:
+                self.stderr.write(f"Item {error['index']}: {error['error']}")
+            raise CommandError(f"{len(errors)} invalid transcripts, nothing imported.")
+
+        batch_size = options["batch_size"]
+        created_total = queued_total = 0
+        for start in range(0, len(messages), batch_size):
+            created, queued_ids = ingest_transcripts(messages[start:start + batch_size],
+                                                     process=options["process"])
+            created_total += len(created)
+            queued_total += len(queued_ids)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {created_total} messages, queued {queued_total} for processing."
+        ))
+
+    def _read_items(self, path):
+        try:
+            if path == "-":
+                raw = sys.stdin.read()
+            else:
+                with open(path, encoding="utf-8") as f:
+                    raw = f.read()
+        except OSError as e:
+            raise CommandError(f"Failed to read {path}: {e}")
+
+        try:
+            stripped = raw.lstrip()
+            if stripped.startswith("["):
+                return json.loads(stripped)
+            return [json.loads(line) for line in raw.splitlines() if line.strip()]
+        except json.JSONDecodeError as e:
+            raise CommandError(f"Invalid JSON in {path}: {e}")
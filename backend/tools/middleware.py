@@ -0,0 +1,60 @@
+import re
+
+import brotli
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_string
+
+ACCEPTS_BROTLI = re.compile(r'\bbr\b')
+ACCEPTS_GZIP = re.compile(r'\bgzip\b')
+
+
+class CompressionMiddleware:
+    """Compress tools API JSON responses with brotli or gzip.
+
+    Only JSON responses under RESPONSE_COMPRESSION_PATHS are touched; the
+    rest of the site (admin, browsable API) keeps Django's defaults. Those
+    responses carry no CSRF tokens or other secrets, and gzip output gets
+    the same random padding as GZipMiddleware to blunt BREACH-style length
+    attacks. Responses smaller than RESPONSE_COMPRESSION_MIN_BYTES,
+    streaming responses and already-encoded responses are passed through
+    unchanged.
+    """
+    # Same as django.middleware.gzip.GZipMiddleware
+    max_random_bytes = 100
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if not request.path.startswith(settings.RESPONSE_COMPRESSION_PATHS):
+            return response
+        if (response.streaming or response.has_header('Content-Encoding')
+                or len(response.content) < settings.RESPONSE_COMPRESSION_MIN_BYTES):
+            return response
+        content_type = response.get('Content-Type', '')
+        if not content_type.startswith(settings.RESPONSE_COMPRESSION_TYPES):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        accept_encoding = request.META.get('HTTP_ACCEPT_ENCODING', '')
+        if ACCEPTS_BROTLI.search(accept_encoding):
+            encoding = 'br'
+            compressed = brotli.compress(response.content, quality=settings.RESPONSE_BROTLI_QUALITY)
+        elif ACCEPTS_GZIP.search(accept_encoding):
+            encoding = 'gzip'
+            compressed = compress_string(response.content, max_random_bytes=self.max_random_bytes)
+        else:
+            return response
+
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = encoding
+        # The body changed, so a strong ETag no longer matches it byte for byte
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        return response
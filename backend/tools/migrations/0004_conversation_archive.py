@@ -0,0 +1,27 @@
+# Generated by Django 5.1.15 on 2026-10-19 10:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tools', '0003_alter_conversationmessage_ai_action_log_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedConversationMessage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('original_id', models.BigIntegerField(unique=True)),
+                ('timestamp', models.DateTimeField(db_index=True)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('status', models.CharField(choices=[('in_progress', 'In Progress'), ('finished', 'Finished'), ('errored', 'Errored'), ('killed', 'Killed')], max_length=255)),
+                ('scene', models.CharField(choices=[('None', 'Agents have not yet decided the scene'), ('G1', 'Direct-Structured Goal Scene'), ('G2', 'Values-Deep-Dive Goal Scene'), ('G3', 'Strategic-Analytical Goal Scene'), ('R1', 'Systematic-Assessment Reality Scene'), ('R2', 'Emotional-Landscape Reality Scene'), ('R3', 'Systems-Thinking Reality Scene'), ('O1', 'Strategic-Analytical Opportunity Scene'), ('O2', 'Solution-Engineering Opportunity Scene'), ('O3', 'Creative-Generative Opportunity Scene'), ('W1', 'Action-Planning Way Forward Scene'), ('W2', 'Commitment-Building Way Forward Scene'), ('W3', 'Integration-Focused Way Forward Scene')], default='None', max_length=255)),
+                ('ai_action_log', models.CharField(choices=[('init-agent-flow', 'Initializing Agent Flow'), ('get-message-history', 'Get previous messages'), ('scene', 'Scene Architecture Determination'), ('rethink', 'Rethinking'), ('agent-thinks', 'Agent thinks now'), ('agent-observes', 'Agent observes now'), ('agent-decides-action', 'Agent action decision'), ('final-answer', 'The final answer is cooking')], default='init-agent-flow', max_length=255)),
+                ('message_compressed', models.BinaryField()),
+                ('ai_response_compressed', models.BinaryField(blank=True, null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.15 on 2026-10-19 11:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tools', '0005_agentevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedconversationmessage',
+            name='conversation_id',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='conversationmessage',
+            name='conversation_id',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=64),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.15 on 2026-10-19 11:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tools', '0006_conversation_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='agentevent',
+            name='attempt',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,19 @@
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction; building the
+    # index this way keeps writes to the message table going meanwhile.
+    atomic = False
+
+    dependencies = [
+        ('tools', '0007_agentevent_attempt'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='conversationmessage',
+            index=models.Index(fields=['timestamp'], name='tools_msg_timestamp_idx'),
+        ),
+    ]
@@ -1,5 +1,20 @@
+import zlib
+
 from django.db import models
 
+
+def compress_text(text):
+    if text is None:
+        return None
+    return zlib.compress(text.encode('utf-8'))
+
+
+def decompress_text(data):
+    if data is None:
+        return None
+    return zlib.decompress(bytes(data)).decode('utf-8')
+
+
 class ConversationMessage(models.Model):
     STATUS_CHOICES = [
         ('in_progress', 'In Progress'),
@@ -36,6 +51,7 @@ class ConversationMessage(models.Model):
     ]
 
     message = models.TextField()
+    conversation_id = models.CharField(max_length=64, blank=True, default='', db_index=True)
     timestamp = models.DateTimeField(auto_now_add=True)
     status = models.CharField(max_length=255, choices=STATUS_CHOICES, default='in_progress')
     scene = models.CharField(max_length=255, choices=SCENE_CHOICES, default='None')
@@ -43,5 +59,97 @@ class ConversationMessage(models.Model):
 
     ai_action_log = models.CharField(max_length=255, choices=TOOLS_CHOICES, default='init-agent-flow')
 
+    ARCHIVABLE_STATUSES = ('finished', 'killed')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['timestamp'], name='tools_msg_timestamp_idx'),
+        ]
+
+    def history_entries(self):
+        """The entries this message contributes to the conversation history."""
+        entries = [{
+            "role": "user",
+            "content": self.message,
+            "status": self.status,
+            "timestamp": self.timestamp
+        }]
+        if self.ai_response:
+            entries.append({
+                "role": "assistant",
+                "content": self.ai_response,
+                "timestamp": self.timestamp
+            })
+        return entries
+
+    def __str__(self):
+        return f"{self.message[:50]}"
+
+
+class ArchivedConversationMessage(models.Model):
+    """Cold copy of a finished or killed ConversationMessage.
+
+    Transcript and response are stored zlib-compressed; read them through the
+    ``message`` and ``ai_response`` properties.
+    """
+    original_id = models.BigIntegerField(unique=True)
+    conversation_id = models.CharField(max_length=64, blank=True, default='', db_index=True)
+    timestamp = models.DateTimeField(db_index=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+    status = models.CharField(max_length=255, choices=ConversationMessage.STATUS_CHOICES)
+    scene = models.CharField(max_length=255, choices=ConversationMessage.SCENE_CHOICES, default='None')
+    ai_action_log = models.CharField(max_length=255, choices=ConversationMessage.TOOLS_CHOICES,
+                                     default='init-agent-flow')
+    message_compressed = models.BinaryField()
+    ai_response_compressed = models.BinaryField(null=True, blank=True)
+
+    @classmethod
+    def from_message(cls, msg):
+        return cls(
+            original_id=msg.id,
+            conversation_id=msg.conversation_id,
+            timestamp=msg.timestamp,
+            status=msg.status,
+            scene=msg.scene,
+            ai_action_log=msg.ai_action_log,
+            message_compressed=compress_text(msg.message),
+            ai_response_compressed=compress_text(msg.ai_response),
+        )
+
+    # Same shape as live messages, so archived turns can be served as history
+    history_entries = ConversationMessage.history_entries
+
+    @property
+    def message(self):
+        return decompress_text(self.message_compressed)
+
+    @property
+    def ai_response(self):
+        return decompress_text(self.ai_response_compressed)
+
     def __str__(self):
         return f"{self.message[:50]}"
+
+
+class AgentEvent(models.Model):
+    """One step of an agent turn, appended in batches by ``tools.events``.
+
+    ``message_id`` is not a foreign key so events outlive archival of the
+    message. ``started_at`` is seconds since the turn started on a monotonic
+    clock and ``duration`` is in seconds. ``attempt`` is the Celery retry
+    count of the task run that recorded the event; each attempt starts its
+    own sequence.
+    """
+    message_id = models.BigIntegerField(db_index=True)
+    attempt = models.PositiveSmallIntegerField(default=0)
+    sequence = models.PositiveSmallIntegerField()
+    step = models.CharField(max_length=255, choices=ConversationMessage.TOOLS_CHOICES)
+    scene = models.CharField(max_length=255, choices=ConversationMessage.SCENE_CHOICES, default='None')
+    started_at = models.FloatField()
+    duration = models.FloatField(default=0)
+    prompt_tokens = models.PositiveIntegerField(default=0)
+    completion_tokens = models.PositiveIntegerField(default=0)
+    created = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.message_id}.{self.attempt}#{self.sequence} {self.step}"
@@ -0,0 +1,44 @@
+import orjson
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+_drf_encoder = JSONEncoder()
+
+
+class ORJSONRenderer(BaseRenderer):
+    """JSON renderer backed by orjson.
+
+    Datetimes and anything orjson does not handle natively go through DRF's
+    encoder, and U+2028/U+2029 are escaped the way
+    ``rest_framework.renderers.JSONRenderer`` escapes them. Integers wider
+    than 64 bits are rendered by ``JSONRenderer`` itself. Unlike DRF's
+    strict mode, NaN and infinities render as ``null`` instead of raising.
+    """
+    media_type = 'application/json'
+    format = 'json'
+    charset = None
+    options = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        try:
+            ret = orjson.dumps(data, default=_drf_encoder.default, option=self.options)
+        except orjson.JSONEncodeError:
+            # orjson only handles 64-bit integers
+            return JSONRenderer().render(data, accepted_media_type, renderer_context)
+        # Same as JSONRenderer: these are valid JSON but not valid JavaScript
+        return ret.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
+
+
+class ORJSONParser(BaseParser):
+    media_type = 'application/json'
+    renderer_class = ORJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
@@ -0,0 +1,82 @@
+"""Speculative context preparation from interim (partial) transcripts.
+
+While the user is still speaking the frontend posts partial transcripts to
+the interim endpoint. A worker prepares the expensive context for the turn
+(conversation history and scene classification) and parks it in the cache.
+When the final transcript arrives, ``process_message_and_update`` reuses
+whatever is still valid instead of recomputing it.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import ConversationMessage
+
+# Keys are suffixed with the conversation id so concurrent conversations
+# do not overwrite or consume each other's partials and context.
+LATEST_INTERIM_KEY = 'speculative:latest-interim:{}'
+CONTEXT_KEY = 'speculative:context:{}'
+
+
+def normalize(transcript):
+    return " ".join(transcript.lower().split())
+
+
+def history_marker(conversation_id='', exclude_id=None):
+    """Cheap fingerprint of the messages the history window would return."""
+    qs = ConversationMessage.objects.order_by('-timestamp')
+    if conversation_id:
+        qs = qs.filter(conversation_id=conversation_id)
+    if exclude_id is not None:
+        qs = qs.exclude(id=exclude_id)
+    return [list(row) for row in qs.values_list('id', 'status')[:settings.SPECULATIVE_HISTORY_LIMIT]]
+
+
+def register_interim(transcript, conversation_id=''):
+    """Record a partial transcript if it is worth preparing context for.
+
+    A partial is worth it when it does not extend the last recorded one, or
+    has grown by at least SPECULATIVE_MIN_GROWTH characters. Returns True when
+    it was recorded and context preparation should be queued.
+    """
+    key = LATEST_INTERIM_KEY.format(conversation_id)
+    transcript = normalize(transcript)
+    previous = cache.get(key)
+    if (previous is not None and transcript.startswith(previous)
+            and len(transcript) - len(previous) < settings.SPECULATIVE_MIN_GROWTH):
+        return False
+    cache.set(key, transcript, settings.SPECULATIVE_CONTEXT_TTL)
+    return True
+
+
+def is_latest_interim(transcript, conversation_id=''):
+    return cache.get(LATEST_INTERIM_KEY.format(conversation_id)) == normalize(transcript)
+
+
+def store_context(context, conversation_id=''):
+    cache.set(CONTEXT_KEY.format(conversation_id), context, settings.SPECULATIVE_CONTEXT_TTL)
+
+
+def take_context(msg):
+    """Pop the speculative context of ``msg``'s conversation and return the parts still valid.
+
+    History is reused when no message in the window has been added or changed
+    status since it was fetched. The scene is reused only when the final
+    transcript extends the partial it was classified on and the partial covers
+    enough of it. Returns a dict with optional ``history`` and ``scene`` keys.
+    """
+    context_key = CONTEXT_KEY.format(msg.conversation_id)
+    context = cache.get(context_key)
+    if context is None:
+        return {}
+    cache.delete_many([context_key, LATEST_INTERIM_KEY.format(msg.conversation_id)])
+
+    reusable = {}
+    if (context.get('conversation_id', '') == msg.conversation_id
+            and context.get('history_marker') == history_marker(msg.conversation_id, exclude_id=msg.id)):
+        reusable['history'] = context['history']
+        final = normalize(msg.message)
+        partial = context['transcript']
+        if (context.get('scene') and final.startswith(partial)
+                and len(partial) >= settings.SPECULATIVE_MIN_COVERAGE * len(final)):
+            reusable['scene'] = context['scene']
+    return reusable
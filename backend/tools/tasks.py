@@ -1,31 +1,31 @@
 import json
 import logging
 import requests
-from celery import shared_task
+from celery import shared_task, group
+from celery.signals import worker_ready, worker_shutdown
 from celery.exceptions import MaxRetriesExceededError
 from .models import ConversationMessage
-from .agent import call_agent, call_agent_no_tools
+from .agent import call_agent, call_agent_no_tools, create_chat_completion
+from .archive import archive_old_messages
+from . import affinity
+from . import speculative
+from . import tts
+from .events import AgentEventRecorder
 from .prompts import get_system_prompt
-from dotenv import load_dotenv
-import os
+from django.conf import settings
 import openai
 import re
 
 logger = logging.getLogger(__name__)
 
-load_dotenv()
-openai.api_key = os.getenv("OPENAI_API_KEY")
-if not openai.api_key:
-    logger.error("OpenAI API key not found. Check your .env file.")
-    raise ValueError("OpenAI API key not found. Check your .env file.")
-
-BASE_URL = os.getenv("VITE_API_URL")
-
 SYSTEM_PROMPT = get_system_prompt()
 
-def fetch_conversation_history_from_api(limit=5):
+def fetch_conversation_history_from_api(limit=5, conversation_id=''):
+    params = {"limit": limit}
+    if conversation_id:
+        params["conversation_id"] = conversation_id
     try:
-        response = requests.get(f"{BASE_URL}/api/tools/history/", params={"limit": limit}, timeout=5)
+        response = requests.get(f"{settings.API_BASE_URL}/api/tools/history/", params=params, timeout=5)
         response.raise_for_status()
         history = response.json()
         return history
@@ -87,8 +87,7 @@ def decide_next_message_state(conversation_summary: str, current_message: str) -
     ]
 
     try:
-        client = openai.OpenAI(api_key=openai.api_key)
-        response = client.chat.completions.create(
+        response = create_chat_completion(
             model="gpt-4o",
             messages=messages,
             temperature=0.3,
@@ -111,25 +110,111 @@ def decide_next_message_state(conversation_summary: str, current_message: str) -
 
     return result
 
+@worker_ready.connect
+def join_affinity_ring(**kwargs):
+    if settings.AGENT_SHARD:
+        affinity.register_shard(settings.AGENT_SHARD)
+
+@worker_shutdown.connect
+def leave_affinity_ring(**kwargs):
+    if settings.AGENT_SHARD:
+        affinity.unregister_shard(settings.AGENT_SHARD)
+
+@shared_task
+def archive_conversation_messages():
+    """Periodic job: move old finished/killed messages out of the hot table."""
+    return archive_old_messages()
+
+@shared_task
+def synthesize_tts_chunk(text):
+    """Synthesize one sentence of a response into the TTS audio cache."""
+    return tts.synthesize_chunk(text)
+
+def start_tts(text):
+    """Queue synthesis of every sentence of ``text``, first sentence first."""
+    if not settings.TTS_ENABLED:
+        return
+    group(synthesize_tts_chunk.s(sentence) for sentence in tts.split_sentences(text)).apply_async()
+
+@shared_task
+def prepare_speculative_context(transcript, conversation_id=''):
+    """Fetch history and classify the scene for a partial transcript before the final one arrives."""
+    if not speculative.is_latest_interim(transcript, conversation_id):
+        return
+    marker = speculative.history_marker(conversation_id)
+    history = fetch_conversation_history_from_api(settings.SPECULATIVE_HISTORY_LIMIT, conversation_id)
+    if isinstance(history, dict):
+        return
+    history_str = json.dumps(history)
+
+    # A newer partial has arrived while fetching; let its task classify the scene
+    if not speculative.is_latest_interim(transcript, conversation_id):
+        return
+    state_result = decide_next_message_state(history_str, transcript)
+    speculative.store_context({
+        "transcript": speculative.normalize(transcript),
+        "conversation_id": conversation_id,
+        "history_marker": marker,
+        "history": history_str,
+        "scene": state_result,
+    }, conversation_id)
+
+
+def enter_step(msg, recorder, step, *changed_fields):
+    """Mark ``step`` as the message's current state and open it in the event log.
+
+    Only ``ai_action_log`` and ``changed_fields`` are written back.
+    """
+    msg.ai_action_log = step
+    msg.save(update_fields=['ai_action_log', *changed_fields])
+    recorder.start(step, msg.scene)
+
+
 @shared_task(bind=True, max_retries=3)
 def process_message_and_update(self, message_id):
-    load_dotenv()
-    openai.api_key = os.getenv("OPENAI_API_KEY")
-    if not openai.api_key:
-        logger.error("OpenAI API key not found inside task.")
-        raise ValueError("OpenAI API key not found inside task.")
-
+    recorder = AgentEventRecorder(message_id, attempt=self.request.retries)
     try:
         msg = ConversationMessage.objects.get(id=message_id)
         if msg.status in ('killed', 'errored'):
             logger.info(f"Skipping message {message_id} with status {msg.status}")
             return
+        # Covers loading the message, taking the speculative context and building the prompt
+        recorder.start('init-agent-flow', msg.scene)
 
         current_prompt = SYSTEM_PROMPT
         messages = [
             {"role": "system", "content": current_prompt},
             {"role": "user", "content": f"New message: {msg.message}"}
         ]
+
+        prepared = speculative.take_context(msg)
+        if "history" in prepared:
+            current_prompt = SYSTEM_PROMPT + prepared["history"]
+            messages[0] = {"role": "system", "content": current_prompt}
+        if "scene" in prepared and prepared["scene"].get("recommended_state"):
+            logger.info(f"Reusing speculative scene for message {message_id}")
+            msg.scene = prepared["scene"]["recommended_state"]
+            enter_step(msg, recorder, 'scene', 'scene')
+            messages.append({
+                "role": "assistant",
+                "content": None,
+                "tool_calls": [{
+                    "id": "speculative-scene",
+                    "function": {
+                        "name": "decide_next_message_state",
+                        "arguments": json.dumps({
+                            "conversation_summary": "See HISTORY in the system prompt.",
+                            "current_message": msg.message
+                        })
+                    },
+                    "type": "function"
+                }]
+            })
+            messages.append({
+                "role": "tool",
+                "content": json.dumps(prepared["scene"]),
+                "tool_call_id": "speculative-scene"
+            })
         max_iterations = 5
 
         tools = [
@@ -175,13 +260,12 @@ def process_message_and_update(self, message_id):
         ]
 
         for iteration in range(max_iterations):
-            msg.refresh_from_db()
+            msg.refresh_from_db(fields=['status'])
             if msg.status in ('errored', 'killed'):
                 logger.info(f"Message {message_id} status changed to {msg.status}, aborting")
                 break
 
-            msg.ai_action_log = 'agent-thinks'
-            msg.save()
+            enter_step(msg, recorder, 'agent-thinks')
             response_message = call_agent(messages, tools, logger)
 
             if "function_call" in response_message:
@@ -207,14 +291,15 @@ def process_message_and_update(self, message_id):
                 })
 
                 if function_name == "fetch_conversation_history_from_api":
-                    msg.refresh_from_db()
+                    msg.refresh_from_db(fields=['status'])
                     if msg.status in ('errored', 'killed'):
                         break
-                    msg.ai_action_log = 'get-message-history'
-                    msg.save()
+                    enter_step(msg, recorder, 'get-message-history')
                     limit = args.get("limit", 5)
-                    history = fetch_conversation_history_from_api(limit)
-                    history_str = json.dumps(history) if not isinstance(history, dict) else json.dumps({"error": history["error"]})
+                    history_str = affinity.cached_history(msg, limit)
+                    if history_str is None:
+                        history = fetch_conversation_history_from_api(limit, msg.conversation_id)
+                        history_str = json.dumps(history) if not isinstance(history, dict) else json.dumps({"error": history["error"]})
                     current_prompt = SYSTEM_PROMPT + history_str
 
                     print(f"CURRENT_PROMPT: {current_prompt}")
@@ -226,11 +311,10 @@ def process_message_and_update(self, message_id):
                         "tool_call_id": tool_call_id
                     })
                 elif function_name == "rephrase_for_tts":
-                    msg.refresh_from_db()
+                    msg.refresh_from_db(fields=['status'])
                     if msg.status in ('errored', 'killed'):
                         break
-                    msg.ai_action_log = 'agent-thinks'
-                    msg.save()
+                    enter_step(msg, recorder, 'agent-thinks')
                     initial_response = args.get("initial_response", "")
                     rephrased_response = rephrase_for_tts(initial_response)
                     messages.append({
@@ -239,17 +323,16 @@ def process_message_and_update(self, message_id):
                         "tool_call_id": tool_call_id
                     })
                 elif function_name == "decide_next_message_state":
-                    msg.refresh_from_db()
+                    msg.refresh_from_db(fields=['status'])
                     if msg.status in ('errored', 'killed'):
                         break
-                    msg.ai_action_log = 'scene'
-                    msg.save()
+                    enter_step(msg, recorder, 'scene')
                     conversation_summary = args.get("conversation_summary", "")
                     current_message = args.get("current_message", msg.message)
                     state_result = decide_next_message_state(conversation_summary, current_message)
                     try:
                         msg.scene = state_result["recommended_state"]  # Update the scene state
-                        msg.save()
+                        msg.save(update_fields=['scene'])
                     except: continue
                     messages.append({
                         "role": "tool",
@@ -265,14 +348,15 @@ def process_message_and_update(self, message_id):
                 try:
                     result = json.loads(content)
                     if "final_answer" in result:
-                        msg.refresh_from_db()
+                        msg.refresh_from_db(fields=['status'])
                         if msg.status in ('errored', 'killed'):
                             break
                         msg.ai_response = result["final_answer"]
-                        msg.ai_action_log = 'final-answer'
                         msg.status = 'finished'
-                        msg.save()
+                        enter_step(msg, recorder, 'final-answer', 'ai_response', 'status')
                         logger.info(f"Final answer saved: {result['final_answer']}")
+                        affinity.remember_turn(msg)
+                        start_tts(msg.ai_response)
                         break
                 except json.JSONDecodeError:
                     json_match = re.search(r'\{.*final_answer.*\}', content)
@@ -280,14 +364,15 @@ def process_message_and_update(self, message_id):
                         try:
                             result = json.loads(json_match.group(0))
                             if "final_answer" in result:
-                                msg.refresh_from_db()
+                                msg.refresh_from_db(fields=['status'])
                                 if msg.status in ('errored', 'killed'):
                                     break
                                 msg.ai_response = result["final_answer"]
-                                msg.ai_action_log = 'final-answer'
                                 msg.status = 'finished'
-                                msg.save()
+                                enter_step(msg, recorder, 'final-answer', 'ai_response', 'status')
                                 logger.info(f"Final answer saved: {result['final_answer']}")
+                                affinity.remember_turn(msg)
+                                start_tts(msg.ai_response)
                                 break
                         except json.JSONDecodeError:
                             logger.warning(f"Failed to parse JSON substring: {json_match.group(0)}")
@@ -296,11 +381,11 @@ def process_message_and_update(self, message_id):
                 break
         else:
             logger.warning(f"Max iterations reached for message {message_id}")
-            msg.refresh_from_db()
+            msg.refresh_from_db(fields=['status'])
             if msg.status not in ('errored', 'killed'):
                 msg.status = 'errored'
                 msg.ai_action_log = 'agent-thinks'
-                msg.save()
+                msg.save(update_fields=['status', 'ai_action_log'])
             return
 
     except ConversationMessage.DoesNotExist:
@@ -310,8 +395,10 @@ def process_message_and_update(self, message_id):
         try:
             self.retry(exc=e, countdown=5)
         except MaxRetriesExceededError:
-            msg.refresh_from_db()
+            msg.refresh_from_db(fields=['status'])
             if msg.status not in ('errored', 'killed'):
                 msg.status = 'errored'
                 msg.ai_action_log = 'agent-thinks'
-                msg.save()
+                msg.save(update_fields=['status', 'ai_action_log'])
+    finally:
+        recorder.finish()
@@ -1,3 +1,476 @@
-from django.test import TestCase
+import gzip
+import io
+import json
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import call_command
+from django.core.cache import cache
+from django.http import HttpResponse, JsonResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+
+from . import affinity, speculative, tts
+from .affinity import ContextLRU, HashRing
+from .archive import archive_old_messages
+from .cassette import Cassette, CassetteMissError
+from .events import AgentEventRecorder, step_latency_breakdown
+from .middleware import CompressionMiddleware
+from .models import AgentEvent, ArchivedConversationMessage, ConversationMessage
+from .renderers import ORJSONParser, ORJSONRenderer
+
+
+def create_message(timestamp, **fields):
+    """Create a message dated ``timestamp`` (auto_now_add ignores the value passed to create())."""
+    msg = ConversationMessage.objects.create(**fields)
+    ConversationMessage.objects.filter(id=msg.id).update(timestamp=timestamp)
+    msg.timestamp = timestamp
+    return msg
+
+
+class ImportTimeCheckTests(SimpleTestCase):
+    def test_api_modules_do_not_import_agent_stack(self):
+        # Import timings vary between machines, so only the heavy-module check
+        # is asserted here.
+        out = StringIO()
+        call_command("check_import_time", budget_ms=60_000, stdout=out)
+        self.assertIn("without the agent stack", out.getvalue())
+
+
+class HashRingTests(SimpleTestCase):
+    keys = [f"conversation-{i}" for i in range(1000)]
+
+    def test_empty_ring(self):
+        self.assertIsNone(HashRing(()).node_for("conversation-1"))
+
+    def test_keys_spread_over_all_nodes(self):
+        ring = HashRing(["agent-0", "agent-1", "agent-2"])
+        self.assertEqual({ring.node_for(key) for key in self.keys}, {"agent-0", "agent-1", "agent-2"})
+
+    def test_only_keys_of_removed_node_move(self):
+        before = HashRing(["agent-0", "agent-1", "agent-2"])
+        after = HashRing(["agent-0", "agent-2"])
+        for key in self.keys:
+            if before.node_for(key) != "agent-1":
+                self.assertEqual(after.node_for(key), before.node_for(key))
+            else:
+                self.assertIn(after.node_for(key), ("agent-0", "agent-2"))
+
+
+class ContextLRUTests(SimpleTestCase):
+    def test_evicts_least_recently_used(self):
+        contexts = ContextLRU(2)
+        contexts.put("a", 1)
+        contexts.put("b", 2)
+        contexts.get("a")
+        contexts.put("c", 3)
+        self.assertEqual(contexts.get("a"), 1)
+        self.assertIsNone(contexts.get("b"))
+        self.assertEqual(contexts.get("c"), 3)
+
+
+class CachedHistoryTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(affinity, "_contexts", ContextLRU(8))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.start = timezone.now() - timedelta(minutes=10)
+        self.count = 0
+
+    def message(self, status="in_progress", ai_response=None):
+        msg = create_message(self.start + timedelta(seconds=self.count), message=f"turn {self.count}",
+                             conversation_id="call-1", status=status, ai_response=ai_response)
+        self.count += 1
+        return msg
+
+    def test_returns_warm_history(self):
+        first = self.message("finished", "reply")
+        affinity.remember_turn(first)
+        current = self.message()
+
+        history = json.loads(affinity.cached_history(current, 5))
+        self.assertEqual([entry["content"] for entry in history], ["turn 0", "reply", "turn 1"])
+
+    def test_stale_when_another_message_was_added(self):
+        affinity.remember_turn(self.message("finished", "reply"))
+        self.message("finished", "handled by another worker")
+        current = self.message()
+
+        self.assertIsNone(affinity.cached_history(current, 5))
+
+    def test_missing_without_conversation_context(self):
+        self.message("finished", "reply")
+        self.assertIsNone(affinity.cached_history(self.message(), 5))
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        self.old = self.now - timedelta(days=40)
+
+    def test_moves_only_old_finished_and_killed_messages(self):
+        finished = create_message(self.old, message="finished", status="finished")
+        killed = create_message(self.old, message="killed", status="killed")
+        errored = create_message(self.old, message="errored", status="errored")
+        running = create_message(self.old, message="running", status="in_progress")
+        recent = create_message(self.now, message="recent", status="finished")
+
+        self.assertEqual(archive_old_messages(retention_days=30), 2)
+        self.assertEqual(
+            set(ArchivedConversationMessage.objects.values_list("original_id", flat=True)),
+            {finished.id, killed.id},
+        )
+        self.assertEqual(
+            set(ConversationMessage.objects.values_list("id", flat=True)),
+            {errored.id, running.id, recent.id},
+        )
+
+    def test_text_round_trips_through_compression(self):
+        text = "Ich möchte besser schlafen. " * 50
+        msg = create_message(self.old, message=text, ai_response="Verstanden ✓", status="finished",
+                             conversation_id="call-1", scene="R2")
+        create_message(self.old, message="no reply", status="killed")
+        archive_old_messages(retention_days=30, batch_size=1)
+
+        archived = ArchivedConversationMessage.objects.get(original_id=msg.id)
+        self.assertEqual(archived.message, text)
+        self.assertEqual(archived.ai_response, "Verstanden ✓")
+        self.assertEqual((archived.conversation_id, archived.scene, archived.timestamp),
+                         ("call-1", "R2", self.old))
+        self.assertIsNone(ArchivedConversationMessage.objects.exclude(id=archived.id).get().ai_response)
+
+    def test_rerun_is_idempotent(self):
+        create_message(self.old, message="finished", status="finished")
+        self.assertEqual(archive_old_messages(retention_days=30), 1)
+        self.assertEqual(archive_old_messages(retention_days=30), 0)
+        self.assertEqual(ArchivedConversationMessage.objects.count(), 1)
+
+    def test_history_merges_archive_in_timestamp_order(self):
+        create_message(self.old - timedelta(days=5), message="old errored", status="errored")
+        create_message(self.old, message="archived", status="finished")
+        create_message(self.now, message="live", status="in_progress")
+        archive_old_messages(retention_days=30)
+
+        response = self.client.get("/api/tools/history/", {"limit": 3, "include_archived": "true"})
+        self.assertEqual([entry["content"] for entry in response.json()],
+                         ["old errored", "archived", "live"])
+
+        response = self.client.get("/api/tools/history/", {"limit": 2, "include_archived": "true"})
+        self.assertEqual([entry["content"] for entry in response.json()], ["archived", "live"])
+
+
+class BulkIngestTests(TestCase):
+    url = "/api/tools/store/bulk/"
+
+    def post(self, payload):
+        return self.client.post(self.url, payload, content_type="application/json")
+
+    @mock.patch("tools.views.enqueue_message")
+    def test_history_import_does_not_take_over_status_and_stop(self, enqueue_message):
+        self.client.post("/api/tools/store/", {"transcript": "live turn"}, content_type="application/json")
+        response = self.post({
+            "transcripts": [{"transcript": "old import", "ai_response": "old reply",
+                             "timestamp": "2024-01-02T03:04:05Z"}],
+            "process": False,
+        })
+        self.assertEqual(response.status_code, 201)
+
+        self.assertEqual(self.client.get("/api/tools/status/").json()["transcript"], "live turn")
+        response = self.client.post("/api/tools/stop/")
+        self.assertEqual((response.status_code, response.json()["transcript"]), (200, "live turn"))
+
+    def test_history_import_requires_timestamp(self):
+        response = self.post({"transcripts": [{"transcript": "old import"}], "process": False})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("timestamp", response.json()["details"][0]["error"])
+        self.assertFalse(ConversationMessage.objects.exists())
+
+    def test_status_and_stop_scoped_to_conversation(self):
+        create_message(timezone.now() - timedelta(seconds=5), message="call 1", conversation_id="call-1")
+        create_message(timezone.now(), message="call 2", conversation_id="call-2")
+
+        response = self.client.get("/api/tools/status/", {"conversation_id": "call-1"})
+        self.assertEqual(response.json()["transcript"], "call 1")
+        response = self.client.post("/api/tools/stop/", {"conversation_id": "call-1"},
+                                    content_type="application/json")
+        self.assertEqual(response.json()["transcript"], "call 1")
+        self.assertEqual(ConversationMessage.objects.get(conversation_id="call-2").status, "in_progress")
+
+    def test_rejects_bare_list(self):
+        response = self.post([{"transcript": "a"}])
+        self.assertEqual(response.status_code, 400)
+
+    def test_one_processed_turn_per_conversation(self):
+        response = self.post({"transcripts": [
+            {"transcript": "first", "conversation_id": "call-1"},
+            {"transcript": "second", "conversation_id": "call-1"},
+        ]})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["details"][0]["index"], 1)
+
+    @mock.patch("tools.ingest.enqueue_messages")
+    def test_processed_messages_enqueued_after_commit(self, enqueue_messages):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            response = self.post({"transcripts": [
+                {"transcript": "first", "conversation_id": "call-1"},
+                {"transcript": "second", "conversation_id": "call-2"},
+                {"transcript": "done", "status": "finished", "conversation_id": "call-1"},
+            ]})
+            enqueue_messages.assert_not_called()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(callbacks), 1)
+        ids = response.json()["ids"]
+        enqueue_messages.assert_called_once_with([(ids[0], "call-1"), (ids[1], "call-2")])
+
+
+class CassetteTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "cassettes", "llm.jsonl.gz")
+
+    @staticmethod
+    def completion(content):
+        from openai.types.chat import ChatCompletion
+        return ChatCompletion.model_validate({
+            "id": "chatcmpl-1", "object": "chat.completion", "created": 1, "model": "gpt-4o",
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": content}}],
+        })
+
+    @staticmethod
+    def request(content, timestamp):
+        history = json.dumps([{"role": "user", "content": "earlier", "timestamp": timestamp}])
+        return {"model": "gpt-4o", "messages": [{"role": "system", "content": "HISTORY: " + history},
+                                                {"role": "user", "content": content}]}
+
+    def test_record_then_replay_without_network(self):
+        # Each Cassette appends its own gzip member, as separate worker processes do
+        Cassette(self.path, "record").chat_completion(
+            self.request("hello", "2024-01-02T03:04:05.123456Z"), lambda: self.completion("hi"))
+        Cassette(self.path, "record").chat_completion(
+            self.request("bye", "2024-01-02T03:04:06Z"), lambda: self.completion("see you"))
+        with gzip.open(self.path, "rt") as f:
+            self.assertEqual(len(f.readlines()), 2)
+
+        replay = Cassette(self.path, "replay", latency_scale=0)
+        send = mock.Mock(side_effect=AssertionError("replay must not call the API"))
+        # Same conversation replayed against another database: only timestamps differ
+        response = replay.chat_completion(self.request("bye", "2025-06-07T08:09:10+00:00"), send)
+        self.assertEqual(response.choices[0].message.content, "see you")
+        response = replay.chat_completion(self.request("hello", "2025-06-07T08:09:09+00:00"), send)
+        self.assertEqual(response.choices[0].message.content, "hi")
+
+    def test_replay_miss_raises(self):
+        Cassette(self.path, "record").chat_completion(
+            self.request("hello", "2024-01-02T03:04:05Z"), lambda: self.completion("hi"))
+        replay = Cassette(self.path, "replay", latency_scale=0)
+        with self.assertRaises(CassetteMissError):
+            replay.chat_completion(self.request("something else", "2024-01-02T03:04:05Z"), None)
+
+    def test_sequence_replays_in_recorded_order(self):
+        record = Cassette(self.path, "record")
+        for content in ("one", "two"):
+            record.chat_completion(self.request(content, "2024-01-02T03:04:05Z"),
+                                   lambda content=content: self.completion(content))
+        replay = Cassette(self.path, "replay", latency_scale=0, match="sequence")
+        other = self.request("unrelated", "2024-01-02T03:04:05Z")
+        self.assertEqual(replay.chat_completion(other, None).choices[0].message.content, "one")
+        self.assertEqual(replay.chat_completion(other, None).choices[0].message.content, "two")
+        with self.assertRaises(CassetteMissError):
+            replay.chat_completion(other, None)
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                        "LOCATION": "speculative-tests"}},
+    SPECULATIVE_MIN_COVERAGE=0.6,
+)
+class SpeculativeContextTests(TestCase):
+    scene = {"recommended_state": "G1", "explanation": "goal talk"}
+
+    def setUp(self):
+        cache.clear()
+        create_message(timezone.now() - timedelta(minutes=1), message="earlier", status="finished",
+                       conversation_id="call-1")
+
+    def prepare(self, partial, conversation_id="call-1"):
+        speculative.register_interim(partial, conversation_id)
+        speculative.store_context({
+            "transcript": speculative.normalize(partial),
+            "conversation_id": conversation_id,
+            "history_marker": speculative.history_marker(conversation_id),
+            "history": "HISTORY",
+            "scene": self.scene,
+        }, conversation_id)
+
+    def final(self, transcript, conversation_id="call-1"):
+        return ConversationMessage.objects.create(message=transcript, conversation_id=conversation_id)
+
+    def test_reuses_history_and_scene_for_covering_prefix(self):
+        self.prepare("I want to get better at my job")
+        msg = self.final("I want to get better at my job and sleep")
+        self.assertEqual(speculative.take_context(msg), {"history": "HISTORY", "scene": self.scene})
+
+    def test_scene_dropped_when_partial_covers_too_little(self):
+        self.prepare("I want")
+        msg = self.final("I want to get better at my job and sleep")
+        self.assertEqual(speculative.take_context(msg), {"history": "HISTORY"})
+
+    def test_scene_dropped_when_final_does_not_extend_partial(self):
+        self.prepare("I want to get better at my job")
+        msg = self.final("Actually I want to talk about my sleep")
+        self.assertEqual(speculative.take_context(msg), {"history": "HISTORY"})
+
+    def test_history_dropped_when_marker_changes(self):
+        self.prepare("I want to get better at my job")
+        ConversationMessage.objects.filter(message="earlier").update(status="killed")
+        msg = self.final("I want to get better at my job")
+        self.assertEqual(speculative.take_context(msg), {})
+
+    def test_taken_once_per_conversation(self):
+        self.prepare("I want to get better at my job")
+        self.prepare("Something else entirely", conversation_id="call-2")
+        msg = self.final("I want to get better at my job")
+
+        self.assertIn("history", speculative.take_context(msg))
+        self.assertEqual(speculative.take_context(msg), {})
+        self.assertTrue(speculative.is_latest_interim("Something else entirely", "call-2"))
+        other = self.final("Something else entirely", conversation_id="call-2")
+        self.assertIn("scene", speculative.take_context(other))
+
+
+class SplitSentencesTests(SimpleTestCase):
+    def test_splits_on_sentence_punctuation(self):
+        self.assertEqual(tts.split_sentences("Hello there.  How are you? Great!"),
+                         ["Hello there.", "How are you?", "Great!"])
+
+    def test_keeps_abbreviations_and_initials_in_sentence(self):
+        self.assertEqual(
+            tts.split_sentences("Mr. Smith met Dr. J. Watson. Try e.g. walking. So do I. Done"),
+            ["Mr. Smith met Dr. J. Watson.", "Try e.g. walking.", "So do I.", "Done"],
+        )
+
+    def test_empty(self):
+        self.assertEqual(tts.split_sentences(None), [])
+
+
+class AudioCacheTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.cache = tts.AudioCache(directory.name, max_bytes=25)
+
+    def put(self, key, size=10, age=0):
+        path = self.cache.put(key, b"x" * size, "wav")
+        mtime = time.time() - age
+        os.utime(path, (mtime, mtime))
+        return path
+
+    def test_evicts_least_recently_used(self):
+        self.put("a", age=100)
+        self.put("b", age=50)
+        self.assertIsNotNone(self.cache.get("a"))  # now the most recently used
+        self.put("c")
+        self.assertIsNone(self.cache.path("b"))
+        self.assertIsNotNone(self.cache.path("a"))
+        self.assertEqual(self.cache.get("c")[0], b"x" * 10)
+
+    def test_keeps_file_just_written(self):
+        self.put("old", age=100)
+        self.put("big", size=30)
+        self.assertIsNone(self.cache.path("old"))
+        self.assertIsNotNone(self.cache.path("big"))
+
+        self.put("small")
+        self.assertIsNone(self.cache.path("big"))
+        self.assertIsNotNone(self.cache.path("small"))
+
+
+class StepLatencyTests(TestCase):
+    def record(self, message_id, attempt, steps):
+        recorder = AgentEventRecorder(message_id, attempt=attempt)
+        for step in steps:
+            recorder.start(step, "None")
+        recorder.finish()
+
+    def test_counts_only_last_attempt_of_each_turn(self):
+        self.record(1, 0, ["init-agent-flow", "scene", "agent-thinks"])
+        self.record(1, 1, ["init-agent-flow", "final-answer"])
+        self.record(2, 0, ["init-agent-flow", "agent-thinks"])
+
+        self.assertEqual(AgentEvent.objects.filter(message_id=1).count(), 5)
+        counts = {row["step"]: row["count"] for row in step_latency_breakdown(10)}
+        self.assertEqual(counts, {"init-agent-flow": 2, "final-answer": 1, "agent-thinks": 1})
+
+    def test_limits_to_recent_turns(self):
+        self.record(1, 0, ["scene"])
+        self.record(2, 0, ["agent-thinks"])
+        self.assertEqual([row["step"] for row in step_latency_breakdown(1)], ["agent-thinks"])
+
+    def test_rejects_turns_below_one(self):
+        self.assertEqual(self.client.get("/api/tools/events/latency/", {"turns": 0}).status_code, 400)
+
+
+class ORJSONRendererTests(SimpleTestCase):
+    def assertMatchesDRF(self, data):
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_datetimes(self):
+        self.assertMatchesDRF({"timestamp": datetime(2024, 1, 2, 3, 4, 5, 123456, tzinfo=dt_timezone.utc)})
+
+    def test_line_separators_escaped(self):
+        self.assertMatchesDRF({"transcript": "one\u2028two\u2029three"})
+        self.assertNotIn("\u2028".encode(), ORJSONRenderer().render({"t": "\u2028"}))
+
+    def test_integers_wider_than_64_bits(self):
+        self.assertMatchesDRF({"n": 2 ** 70, "m": -(2 ** 70)})
+
+    def test_parser_rejects_bad_json(self):
+        with self.assertRaises(ParseError):
+            ORJSONParser().parse(io.BytesIO(b'{"transcript": '))
+        self.assertEqual(ORJSONParser().parse(io.BytesIO(b'{"a": [1]}')), {"a": [1]})
+
+
+@override_settings(RESPONSE_COMPRESSION_MIN_BYTES=1024, RESPONSE_COMPRESSION_PATHS=("/api/tools/",),
+                   RESPONSE_COMPRESSION_TYPES=("application/json",))
+class CompressionMiddlewareTests(SimpleTestCase):
+    big = {"history": ["hello world"] * 200}
+
+    def respond(self, path, response, accept="gzip, deflate, br"):
+        request = RequestFactory().get(path, HTTP_ACCEPT_ENCODING=accept)
+        return CompressionMiddleware(lambda request: response)(request)
+
+    def test_compresses_tools_json(self):
+        response = self.respond("/api/tools/history/", JsonResponse(self.big))
+        self.assertEqual(response["Content-Encoding"], "br")
+        self.assertIn("Accept-Encoding", response["Vary"])
+
+        response = self.respond("/api/tools/history/", JsonResponse(self.big), accept="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(json.loads(gzip.decompress(response.content)), self.big)
+
+    def test_skips_small_responses(self):
+        response = self.respond("/api/tools/status/", JsonResponse({"status": "finished"}))
+        self.assertFalse(response.has_header("Content-Encoding"))
+
+    def test_skips_other_paths(self):
+        response = self.respond("/admin/", JsonResponse(self.big))
+        self.assertFalse(response.has_header("Content-Encoding"))
+
+    def test_skips_tts_audio(self):
+        audio = HttpResponse(b"\0" * 4096, content_type="audio/x-wav")
+        response = self.respond("/api/tools/tts/" + "0" * 64 + "/", audio)
+        self.assertFalse(response.has_header("Content-Encoding"))
+        self.assertEqual(len(response.content), 4096)
+
+    def test_weakens_etag(self):
+        response = JsonResponse(self.big)
+        response["ETag"] = '"abc"'
+        self.assertEqual(self.respond("/api/tools/history/", response)["ETag"], 'W/"abc"')
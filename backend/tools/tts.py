@@ -0,0 +1,205 @@
+"""Server-side text-to-speech stage.
+
+Final answers are split into sentences and each sentence is synthesized by
+the configured provider (``TTS_PROVIDER``). Audio is cached on disk under a
+hash of provider, voice and text, so repeated phrasings (fallbacks, common
+prompts) are served without calling the provider again. The cache is kept
+under ``TTS_CACHE_MAX_BYTES`` by evicting the least recently used files.
+Workers write the audio and the API process serves it, so ``TTS_CACHE_DIR``
+must be the same directory for both: one host, or a volume mounted into
+every API and worker container.
+"""
+import hashlib
+import io
+import logging
+import mimetypes
+import os
+import re
+import threading
+import wave
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+')
+# A period after these words (or after a capital initial) does not end a sentence
+ABBREVIATIONS = frozenset({'mr', 'mrs', 'ms', 'dr', 'prof', 'sr', 'jr', 'st', 'vs', 'e.g', 'i.e'})
+INITIAL = re.compile(r'[A-HJ-Z]\.')
+AUDIO_EXTENSIONS = ('mp3', 'wav')
+
+
+class TTSProvider:
+    """Base class for speech synthesis backends."""
+    extension = 'mp3'
+
+    def synthesize(self, text):
+        """Return the audio bytes for ``text``."""
+        raise NotImplementedError
+
+
+class LocalTTSProvider(TTSProvider):
+    """Offline stand-in producing silent WAV audio roughly as long as the text takes to say."""
+    extension = 'wav'
+    sample_rate = 16000
+    seconds_per_char = 0.06
+
+    def synthesize(self, text):
+        frames = int(len(text) * self.seconds_per_char * self.sample_rate)
+        buffer = io.BytesIO()
+        with wave.open(buffer, 'wb') as f:
+            f.setnchannels(1)
+            f.setsampwidth(2)
+            f.setframerate(self.sample_rate)
+            f.writeframes(b'\x00\x00' * frames)
+        return buffer.getvalue()
+
+
+class ElevenLabsTTSProvider(TTSProvider):
+    extension = 'mp3'
+    url = "https://api.elevenlabs.io/v1/text-to-speech/{voice_id}"
+
+    def synthesize(self, text):
+        import requests
+
+        response = requests.post(
+            self.url.format(voice_id=settings.TTS_VOICE),
+            headers={
+                "Accept": "audio/mpeg",
+                "Content-Type": "application/json",
+                "xi-api-key": settings.ELEVENLABS_API_KEY,
+            },
+            json={
+                "text": text,
+                "model_id": "eleven_monolingual_v1",
+                "voice_settings": {"stability": 0.5, "similarity_boost": 0.5},
+            },
+            timeout=30,
+        )
+        response.raise_for_status()
+        return response.content
+
+
+_provider = None
+
+
+def get_provider():
+    global _provider
+    if _provider is None:
+        _provider = import_string(settings.TTS_PROVIDER)()
+    return _provider
+
+
+def split_sentences(text):
+    text = text or ''
+    sentences = []
+    start = 0
+    for match in SENTENCE_BOUNDARY.finditer(text):
+        last_word = text[start:match.start()].split()[-1]
+        if last_word[:-1].lower() in ABBREVIATIONS or INITIAL.fullmatch(last_word):
+            continue
+        sentences.append(text[start:match.start()])
+        start = match.end()
+    sentences.append(text[start:])
+    return [sentence.strip() for sentence in sentences if sentence.strip()]
+
+
+def chunk_key(text):
+    payload = f"{settings.TTS_PROVIDER}|{settings.TTS_VOICE}|{text}"
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class AudioCache:
+    """Size-bounded on-disk audio cache keyed by content hash."""
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def path(self, key):
+        """Return the cached file for ``key``, or None when it is not cached."""
+        for extension in AUDIO_EXTENSIONS:
+            path = os.path.join(self.directory, f"{key}.{extension}")
+            if os.path.exists(path):
+                return path
+        return None
+
+    def get(self, key):
+        path = self.path(key)
+        if path is None:
+            return None
+        try:
+            os.utime(path)  # mark as recently used
+            with open(path, 'rb') as f:
+                return f.read(), mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        except FileNotFoundError:
+            # Evicted by another process since path() found it
+            return None
+
+    def put(self, key, audio, extension):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{key}.{extension}")
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(audio)
+        os.replace(tmp_path, path)
+        self.evict(keep=path)
+        return path
+
+    def evict(self, keep=None):
+        """Drop least recently used files, other than ``keep``, until the cache fits in ``max_bytes``."""
+        with self._lock:
+            entries = []
+            for name in os.listdir(self.directory):
+                if name.endswith('.tmp'):
+                    continue
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                if path == keep:
+                    continue
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+
+
+_cache = None
+
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        _cache = AudioCache(settings.TTS_CACHE_DIR, settings.TTS_CACHE_MAX_BYTES)
+    return _cache
+
+
+def synthesize_chunk(text):
+    """Make sure audio for ``text`` is cached and return its key."""
+    key = chunk_key(text)
+    cache = get_cache()
+    if cache.path(key) is None:
+        provider = get_provider()
+        cache.put(key, provider.synthesize(text), provider.extension)
+        logger.info(f"Synthesized TTS chunk {key[:12]} ({len(text)} chars)")
+    return key
+
+
+def response_chunks(text):
+    """Describe the audio chunks of a response and whether each is ready."""
+    cache = get_cache()
+    chunks = []
+    for sentence in split_sentences(text):
+        key = chunk_key(sentence)
+        chunks.append({"key": key, "text": sentence, "ready": cache.path(key) is not None})
+    return chunks
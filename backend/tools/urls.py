@@ -1,10 +1,15 @@
-from django.urls import path
-from .views import StoreTranscriptView, ConversationHistoryView, \
-                   MessageStatusView, StopExecutionView
+from django.urls import path, re_path
+from .views import StoreTranscriptView, InterimTranscriptView, BulkStoreTranscriptsView, \
+                   ConversationHistoryView, MessageStatusView, StopExecutionView, TTSAudioView, \
+                   StepLatencyView
 
 urlpatterns = [
     path("store/", StoreTranscriptView.as_view(), name="store-transcript"),
+    path("store/interim/", InterimTranscriptView.as_view(), name="interim-transcript"),
+    path("store/bulk/", BulkStoreTranscriptsView.as_view(), name="bulk-store-transcripts"),
     path("history/", ConversationHistoryView.as_view(), name="conversation-history"),
     path("status/", MessageStatusView.as_view(), name="message-status"),
     path("stop/", StopExecutionView.as_view(), name="stop-execution"),
+    path("events/latency/", StepLatencyView.as_view(), name="step-latency"),
+    re_path(r"^tts/(?P<key>[0-9a-f]{64})/$", TTSAudioView.as_view(), name="tts-audio"),
 ]
@@ -1,9 +1,15 @@
+from django.conf import settings
+from django.http import HttpResponse
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 
-from .models import ConversationMessage
-from .tasks import process_message_and_update
+from .models import ConversationMessage, ArchivedConversationMessage
+from .dispatch import enqueue_message, enqueue_speculative_context
+from .speculative import register_interim
+from . import tts
+from .events import step_latency_breakdown
+from .ingest import validate_transcripts, ingest_transcripts
 
 class StoreTranscriptView(APIView):
 
@@ -18,16 +24,23 @@ class StoreTranscriptView(APIView):
             return Response({"error": f"Invalid status. Allowed values are: {allowed_statuses}"},
                             status=status.HTTP_400_BAD_REQUEST)
 
+        conversation_id = request.data.get("conversation_id", "")
+        if not isinstance(conversation_id, str) or len(conversation_id) > 64:
+            return Response({"error": "Invalid conversation_id."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
         message_instance = ConversationMessage.objects.create(
             message=transcript,
+            conversation_id=conversation_id,
             status=status_value,
             ai_response=None
         )
 
-        process_message_and_update.delay(message_instance.id)
+        enqueue_message(message_instance.id, message_instance.conversation_id)
 
         data = {
             "id": message_instance.id,
+            "conversation_id": message_instance.conversation_id,
             "transcript": message_instance.message,
             "timestamp": message_instance.timestamp,
             "status": message_instance.status,
@@ -35,6 +48,64 @@ class StoreTranscriptView(APIView):
         return Response(data, status=status.HTTP_201_CREATED)
 
 
+class InterimTranscriptView(APIView):
+
+    def post(self, request, format=None):
+        transcript = request.data.get("transcript")
+        if not transcript or not isinstance(transcript, str):
+            return Response({"error": "No transcript provided."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        conversation_id = request.data.get("conversation_id", "")
+        if not isinstance(conversation_id, str) or len(conversation_id) > 64:
+            return Response({"error": "Invalid conversation_id."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        queued = register_interim(transcript, conversation_id)
+        if queued:
+            enqueue_speculative_context(transcript, conversation_id)
+
+        data = {
+            "transcript": transcript,
+            "queued": queued,
+        }
+        return Response(data, status=status.HTTP_202_ACCEPTED)
+
+
+class BulkStoreTranscriptsView(APIView):
+
+    def post(self, request, format=None):
+        if not isinstance(request.data, dict):
+            return Response({"error": "Expected an object with a transcripts list."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        items = request.data.get("transcripts")
+        if not isinstance(items, list) or not items:
+            return Response({"error": "No transcripts provided."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        max_batch = settings.BULK_INGEST_MAX_BATCH
+        if len(items) > max_batch:
+            return Response({"error": f"Too many transcripts. Maximum batch size is {max_batch}."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        process = request.data.get("process", True)
+        if not isinstance(process, bool):
+            return Response({"error": "Invalid process value. Expected a boolean."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        messages, errors = validate_transcripts(items, process=process)
+        if errors:
+            return Response({"error": "Invalid transcripts.", "details": errors},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        created, queued_ids = ingest_transcripts(messages, process=process)
+
+        data = {
+            "created": len(created),
+            "queued": len(queued_ids),
+            "ids": [msg.id for msg in created],
+        }
+        return Response(data, status=status.HTTP_201_CREATED)
+
+
 class ConversationHistoryView(APIView):
     def get(self, request, format=None):
         try:
@@ -42,31 +113,51 @@ class ConversationHistoryView(APIView):
         except ValueError:
             return Response({"error": "Invalid limit value."}, status=status.HTTP_400_BAD_REQUEST)
 
-        messages_qs = ConversationMessage.objects.all().order_by('-timestamp')[:limit]
-        messages = list(messages_qs)[::-1]  # Reverse so oldest first
+        messages_qs = ConversationMessage.objects.all()
+        conversation_id = request.query_params.get("conversation_id")
+        if conversation_id:
+            messages_qs = messages_qs.filter(conversation_id=conversation_id)
+        messages = list(messages_qs.order_by('-timestamp')[:limit])
+
+        # Older turns may have been moved to the archive. Rows the archiver
+        # skips (e.g. errored) stay in the hot table however old they are, so
+        # merge both windows by timestamp rather than appending one to the other.
+        if request.query_params.get("include_archived") == "true":
+            archived_qs = ArchivedConversationMessage.objects.all()
+            if conversation_id:
+                archived_qs = archived_qs.filter(conversation_id=conversation_id)
+            messages += list(archived_qs.order_by('-timestamp')[:limit])
+            messages = sorted(messages, key=lambda msg: msg.timestamp, reverse=True)[:limit]
+        messages = messages[::-1]  # Reverse so oldest first
 
         conversation_history = []
         for msg in messages:
-            conversation_history.append({
-                "role": "user",
-                "content": msg.message,
-                "status": msg.status,
-                "timestamp": msg.timestamp
-            })
-            if msg.ai_response:
-                conversation_history.append({
-                    "role": "assistant",
-                    "content": msg.ai_response,
-                    "timestamp": msg.timestamp
-                })
+            conversation_history.extend(msg.history_entries())
 
         return Response(conversation_history, status=status.HTTP_200_OK)
 
 
+class StepLatencyView(APIView):
+
+    def get(self, request, format=None):
+        try:
+            turns = int(request.query_params.get("turns", 100))
+        except ValueError:
+            return Response({"error": "Invalid turns value."}, status=status.HTTP_400_BAD_REQUEST)
+        if turns < 1:
+            return Response({"error": "turns must be at least 1."}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(step_latency_breakdown(turns), status=status.HTTP_200_OK)
+
+
 class MessageStatusView(APIView):
 
     def get(self, request, format=None):
-        message_instance = ConversationMessage.objects.all().order_by('-timestamp').first()
+        messages_qs = ConversationMessage.objects.all()
+        conversation_id = request.query_params.get("conversation_id")
+        if conversation_id:
+            messages_qs = messages_qs.filter(conversation_id=conversation_id)
+        message_instance = messages_qs.order_by('-timestamp').first()
         if not message_instance:
             return Response({"error": "No messages found."}, status=status.HTTP_404_NOT_FOUND)
 
@@ -78,13 +169,32 @@ class MessageStatusView(APIView):
             "ai_response": message_instance.ai_response,
             "timestamp": message_instance.timestamp,
         }
+        if settings.TTS_ENABLED and message_instance.ai_response:
+            response_data["audio"] = tts.response_chunks(message_instance.ai_response)
         return Response(response_data, status=status.HTTP_200_OK)
 
 
+class TTSAudioView(APIView):
+
+    def get(self, request, key, format=None):
+        cached = tts.get_cache().get(key)
+        if cached is None:
+            return Response({"error": "Audio not ready."}, status=status.HTTP_404_NOT_FOUND)
+        audio, content_type = cached
+        return HttpResponse(audio, content_type=content_type)
+
+
 class StopExecutionView(APIView):
 
     def post(self, request, format=None):
-        message_instance = ConversationMessage.objects.all().order_by('-timestamp').first()
+        messages_qs = ConversationMessage.objects.all()
+        conversation_id = request.data.get("conversation_id") if isinstance(request.data, dict) else None
+        if conversation_id is not None and not isinstance(conversation_id, str):
+            return Response({"error": "Invalid conversation_id."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if conversation_id:
+            messages_qs = messages_qs.filter(conversation_id=conversation_id)
+        message_instance = messages_qs.order_by('-timestamp').first()
         if not message_instance:
             return Response({"error": "No message found."}, status=status.HTTP_404_NOT_FOUND)
 